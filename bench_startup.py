@@ -0,0 +1,170 @@
+"""
+Startup and per-request overhead benchmark for both Django projects.
+
+Compares the default settings with API_ONLY=1 on three numbers:
+
+* startup: wall time of a fresh interpreter until the WSGI application is built
+* first request: time from django.setup() to the first response in a fresh
+  process (URLconf, views and their imports are loaded lazily at this point)
+* middleware: per-request cost of the MIDDLEWARE chain, measured as the
+  difference between warm requests with the configured chain and with none.
+  The two are alternated over several rounds and the fastest round of each
+  is compared; a difference below the noise floor is shown as "<noise"
+
+Usage:
+    python bench_startup.py [--project stage_0|stage_1] [--runs 5] [--requests 500]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+
+# with/without middleware pairs measured per process
+MIDDLEWARE_ROUNDS = 5
+
+PROJECTS = {
+    'stage_0': {'settings': 'profile_project.settings', 'path': '/me/', 'migrate': False},
+    'stage_1': {'settings': 'string_analyzer.settings', 'path': '/strings/benchmark', 'migrate': True},
+}
+
+
+def _child_startup():
+    import django
+    from django.core.wsgi import get_wsgi_application
+
+    django.setup(set_prefix=False)
+    get_wsgi_application()
+
+
+def _child_requests(project, requests):
+    import django
+
+    started = time.perf_counter()
+    django.setup(set_prefix=False)
+
+    from unittest import mock
+
+    from django.test import Client, override_settings
+
+    path = PROJECTS[project]['path']
+    # keep the benchmark off the network and out of the rate limiter
+    override_settings(ADMISSION_CONTROL={'RATE': 10**9, 'BURST': 10**9}).enable()
+    if project == 'stage_0':
+        mock.patch('profile_app.views.get_cat_fact', return_value='benchmark').start()
+
+    client = Client()
+    response = client.get(path)
+    first_request = time.perf_counter() - started
+    if response.status_code >= 500:
+        raise SystemExit(f'{path} returned {response.status_code}')
+
+    def per_request(client):
+        client.get(path)
+        started = time.perf_counter()
+        for _ in range(requests):
+            client.get(path)
+        return (time.perf_counter() - started) / requests
+
+    no_chain = override_settings(MIDDLEWARE=[])
+    with no_chain:
+        bare_client = Client()
+
+    # alternate so drift (caches, CPU frequency) hits both sides alike
+    with_chain, without_chain = [], []
+    for _ in range(MIDDLEWARE_ROUNDS):
+        with_chain.append(per_request(client))
+        with no_chain:
+            without_chain.append(per_request(bare_client))
+
+    print(json.dumps({
+        'first_request': first_request,
+        'per_request': statistics.median(with_chain),
+        'middleware': min(with_chain) - min(without_chain),
+    }))
+
+
+def _run_child(project, api_only, db, *args):
+    env = dict(os.environ)
+    env['DJANGO_SETTINGS_MODULE'] = PROJECTS[project]['settings']
+    env['API_ONLY'] = '1' if api_only else ''
+    env['DATABASE_URL'] = f'sqlite:///{db}'
+    result = subprocess.run(
+        [sys.executable, str(Path(__file__).resolve()), '--child', *args],
+        cwd=ROOT / project,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(result.stderr)
+    return result.stdout
+
+
+def _migrate(project, api_only, db):
+    env = dict(os.environ, API_ONLY='1' if api_only else '', DATABASE_URL=f'sqlite:///{db}')
+    subprocess.run(
+        [sys.executable, 'manage.py', 'migrate', '--verbosity', '0'],
+        cwd=ROOT / project,
+        env=env,
+        check=True,
+    )
+
+
+def benchmark(project, api_only, runs, requests, db):
+    if PROJECTS[project]['migrate']:
+        _migrate(project, api_only, db)
+
+    startup = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        _run_child(project, api_only, db, 'startup')
+        startup.append(time.perf_counter() - started)
+
+    samples = [json.loads(_run_child(project, api_only, db, 'requests', project, str(requests))) for _ in range(runs)]
+    return {
+        'startup': statistics.median(startup),
+        'first_request': statistics.median(s['first_request'] for s in samples),
+        'per_request': statistics.median(s['per_request'] for s in samples),
+        'middleware': statistics.median(s['middleware'] for s in samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--project', choices=sorted(PROJECTS), action='append')
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes per measurement (median is reported)')
+    parser.add_argument('--requests', type=int, default=500, help='warm requests per per-request sample')
+    args = parser.parse_args()
+
+    print(f"{'project':<9} {'mode':<8} {'startup':>10} {'first req':>10} {'per req':>10} {'middleware':>11}")
+    # throwaway SQLite database so the benchmark never touches db.sqlite3
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp) / 'bench.sqlite3'
+        for project in args.project or sorted(PROJECTS):
+            for api_only in (False, True):
+                r = benchmark(project, api_only, args.runs, args.requests, db)
+                # a chain cheaper than no chain is measurement noise, not a speedup
+                middleware = f"{r['middleware'] * 1e6:>9.0f}us" if r['middleware'] > 0 else f"{'<noise':>11}"
+                print(
+                    f"{project:<9} {'api-only' if api_only else 'default':<8} "
+                    f"{r['startup'] * 1000:>8.1f}ms {r['first_request'] * 1000:>8.1f}ms "
+                    f"{r['per_request'] * 1e6:>8.0f}us {middleware}"
+                )
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        sys.path.insert(0, os.getcwd())
+        if sys.argv[2] == 'startup':
+            _child_startup()
+        else:
+            _child_requests(sys.argv[3], int(sys.argv[4]))
+    else:
+        main()
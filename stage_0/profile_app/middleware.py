@@ -0,0 +1,189 @@
+# Same admission controller as stage_1/analyzer/middleware.py. The two projects
+# deploy from their own directories and share no package, so fixes to one copy
+# must be made in the other.
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+ADMISSION_DEFAULTS = {
+    'RATE': 20,                # tokens refilled per second, per client
+    'BURST': 40,               # bucket capacity, the largest burst a client can send
+    'BYTES_PER_TOKEN': 4096,   # request body bytes that cost one extra token
+    'VIEW_COSTS': {},          # url name -> extra tokens for GETs, e.g. unbounded list queries
+    'MAX_CONCURRENT': 16,      # requests processed at once by this worker process
+    'MAX_QUEUE': 32,           # requests allowed to wait for a free slot
+    'QUEUE_TIMEOUT': 0.5,      # seconds a queued request waits before a 503
+    'TRUST_X_FORWARDED_FOR': False,
+    'CACHE': None,             # cache alias to share buckets between processes
+    'MAX_CLIENTS': 10000,      # in-process buckets kept before the oldest are dropped
+}
+
+
+class _LocalBuckets:
+    def __init__(self, max_clients):
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, cost, rate, burst):
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+        return allowed, tokens
+
+    def refund(self, key, cost, burst, rate):
+        with self.lock:
+            if key in self.buckets:
+                tokens, updated = self.buckets[key]
+                self.buckets[key] = (min(burst, tokens + cost), updated)
+
+
+class _CacheBuckets:
+    """
+    Buckets kept in a shared Django cache. The read-modify-write is not
+    atomic, so concurrent requests from one client may overspend slightly.
+    """
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def take(self, key, cost, rate, burst):
+        now = time.time()
+        cache_key = f'admission:{key}'
+        tokens, updated = self.cache.get(cache_key, (burst, now))
+        tokens = min(burst, tokens + max(0, now - updated) * rate)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self.cache.set(cache_key, (tokens, now), timeout=int(burst / rate) + 1)
+        return allowed, tokens
+
+    def refund(self, key, cost, burst, rate):
+        cache_key = f'admission:{key}'
+        bucket = self.cache.get(cache_key)
+        if bucket is not None:
+            tokens, updated = bucket
+            self.cache.set(cache_key, (min(burst, tokens + cost), updated), timeout=int(burst / rate) + 1)
+
+
+class AdmissionControlMiddleware:
+    """
+    Sheds load before it reaches the views: every client gets a token bucket
+    charged by request cost, and a per-worker concurrency limit with a short
+    queue protects latency for everyone else. The limit only bites when the
+    worker serves requests on several threads (gunicorn --threads).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = {**ADMISSION_DEFAULTS, **getattr(settings, 'ADMISSION_CONTROL', {})}
+        self.rate = config['RATE']
+        self.burst = config['BURST']
+        self.bytes_per_token = config['BYTES_PER_TOKEN']
+        self.view_costs = config['VIEW_COSTS']
+        self.max_queue = config['MAX_QUEUE']
+        self.queue_timeout = config['QUEUE_TIMEOUT']
+        self.trust_forwarded = config['TRUST_X_FORWARDED_FOR']
+        self.slots = threading.BoundedSemaphore(config['MAX_CONCURRENT'])
+        self.waiting = 0
+        self.waiting_lock = threading.Lock()
+        if config['CACHE']:
+            self.buckets = _CacheBuckets(config['CACHE'])
+        else:
+            self.buckets = _LocalBuckets(config['MAX_CLIENTS'])
+
+    def __call__(self, request):
+        key = self.client_key(request)
+        cost = self.request_cost(request)
+        allowed, tokens = self.buckets.take(key, cost, self.rate, self.burst)
+        if not allowed:
+            retry_after = math.ceil((cost - tokens) / self.rate)
+            return self.reject(429, "Rate limit exceeded", retry_after)
+
+        if not self.acquire_slot():
+            # the request did no work, so it should not count against the client
+            self.buckets.refund(key, cost, self.burst, self.rate)
+            return self.reject(503, "Server is busy", 1)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            self.slots.release()
+            raise
+
+        if response.streaming:
+            # streamed bodies are produced after we return, hold the slot until the server closes the response
+            self.release_on_close(response)
+        else:
+            self.slots.release()
+        return response
+
+    def release_on_close(self, response):
+        close = response.close
+        released = False
+
+        def close_and_release():
+            nonlocal released
+            try:
+                close()
+            finally:
+                if not released:
+                    released = True
+                    self.slots.release()
+
+        response.close = close_and_release
+
+    def client_key(self, request):
+        if self.trust_forwarded:
+            forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+            if forwarded:
+                return forwarded.split(',')[0].strip()
+        return request.META.get('REMOTE_ADDR', '')
+
+    #One token per request, plus body size and a per-view GET surcharge, capped at the burst size
+    def request_cost(self, request):
+        cost = 1
+        try:
+            cost += int(request.META.get('CONTENT_LENGTH') or 0) // self.bytes_per_token
+        except ValueError:
+            pass
+        if self.view_costs and request.method in SAFE_METHODS:
+            try:
+                url_name = resolve(request.path_info).url_name
+            except Resolver404:
+                url_name = None
+            cost += self.view_costs.get(url_name, 0)
+        return min(cost, self.burst)
+
+    def acquire_slot(self):
+        if self.slots.acquire(blocking=False):
+            return True
+        with self.waiting_lock:
+            if self.waiting >= self.max_queue:
+                return False
+            self.waiting += 1
+        try:
+            return self.slots.acquire(timeout=self.queue_timeout)
+        finally:
+            with self.waiting_lock:
+                self.waiting -= 1
+
+    def reject(self, status_code, message, retry_after):
+        response = JsonResponse({"error": message}, status=status_code)
+        response['Retry-After'] = str(max(1, retry_after))
+        return response
@@ -1,8 +1,9 @@
-import requests
 from django.http import JsonResponse
 from datetime import datetime, timezone
 
 def get_cat_fact():
+    import requests  # imported on first use, it is slow to load and only /me needs it
+
     try:
         response = requests.get("https://catfact.ninja/fact", timeout=5)
         response.raise_for_status()
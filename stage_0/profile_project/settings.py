@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -27,6 +28,10 @@ DEBUG = False
 
 ALLOWED_HOSTS = ["*"]
 
+# API-only mode drops the admin, auth, sessions, messages and templates,
+# none of which /me uses. Enable with API_ONLY=1.
+API_ONLY = os.environ.get('API_ONLY', '') == '1'
+
 
 # Application definition
 
@@ -42,6 +47,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'profile_app.middleware.AdmissionControlMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -67,6 +73,19 @@ TEMPLATES = [
     },
 ]
 
+if API_ONLY:
+    INSTALLED_APPS = [
+        'profile_app',
+    ]
+
+    MIDDLEWARE = [
+        'django.middleware.security.SecurityMiddleware',
+        'profile_app.middleware.AdmissionControlMiddleware',
+        'django.middleware.common.CommonMiddleware',
+    ]
+
+    TEMPLATES = []
+
 WSGI_APPLICATION = 'profile_project.wsgi.application'
 
 
@@ -81,6 +100,36 @@ DATABASES = {
 }
 
 
+# Shared cache for the admission control buckets, e.g.
+# ADMISSION_CACHE_URL=redis://localhost:6379/0 (needs the redis package).
+# Without it every worker keeps its own buckets.
+ADMISSION_CACHE_URL = os.environ.get('ADMISSION_CACHE_URL', '')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+if ADMISSION_CACHE_URL:
+    CACHES['admission'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': ADMISSION_CACHE_URL,
+    }
+
+# Admission control: per-client token buckets and a concurrency limit per
+# worker process. /me waits on the cat facts API, so the limit keeps slow
+# upstream calls from piling up. It only applies with a threaded worker, so
+# the Procfile runs gunicorn with WEB_THREADS (default 16) threads, above
+# MAX_CONCURRENT plus MAX_QUEUE.
+ADMISSION_CONTROL = {
+    'RATE': 10,
+    'BURST': 20,
+    'MAX_CONCURRENT': 8,
+    'MAX_QUEUE': 4,
+    'QUEUE_TIMEOUT': 0.5,
+    'CACHE': 'admission' if ADMISSION_CACHE_URL else None,
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
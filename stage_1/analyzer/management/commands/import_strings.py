@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analyzer.snapshot import DEFAULT_CHUNK_SIZE, SnapshotError, import_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Import a snapshot written by export_strings, skipping strings that already exist'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Snapshot file, the format is detected from its header')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as f:
+                inserted, skipped = import_snapshot(f, options['chunk_size'])
+        except (OSError, SnapshotError) as e:
+            raise CommandError(str(e))
+
+        elapsed = time.perf_counter() - started
+        rate = inserted / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {inserted} rows from {options['path']} in {elapsed:.2f}s ({rate:,.0f} rows/s), "
+            f"skipped {skipped} existing"
+        ))
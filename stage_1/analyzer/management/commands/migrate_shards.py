@@ -0,0 +1,13 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from analyzer.routers import shard_aliases
+
+
+class Command(BaseCommand):
+    help = 'Run migrate on every shard in ANALYZER_SHARDS, the router decides which apps go where'
+
+    def handle(self, *args, **options):
+        for alias in shard_aliases():
+            self.stdout.write(f'Migrating {alias}')
+            call_command('migrate', database=alias, interactive=False, verbosity=options['verbosity'])
@@ -1,6 +1,5 @@
 from django.db import models
-
-from django.db import models
+from django.utils import timezone
 
 class AnalyzedString(models.Model):
     value = models.TextField(unique=True)           
@@ -10,7 +9,8 @@ class AnalyzedString(models.Model):
     unique_characters = models.IntegerField()
     word_count = models.IntegerField()
     character_frequency_map = models.JSONField()
-    created_at = models.DateTimeField(auto_now_add=True) 
+    # a default rather than auto_now_add, so snapshot imports can keep the original time
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     def __str__(self):
         return self.value
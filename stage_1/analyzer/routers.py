@@ -0,0 +1,82 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Set by ReadYourWritesMiddleware while a request has to see its own writes
+_use_primary = ContextVar('analyzer_use_primary', default=False)
+
+
+#Aliases holding a partition of AnalyzedString, 'default' is always shard 0
+def shard_aliases():
+    return getattr(settings, 'ANALYZER_SHARDS', None) or ['default']
+
+
+#Primary alias that owns the row with this sha256 hash
+def shard_for_hash(hash_value):
+    aliases = shard_aliases()
+    if len(aliases) == 1:
+        return aliases[0]
+    prefix = getattr(settings, 'ANALYZER_SHARD_PREFIX_LENGTH', 8)
+    return aliases[int(hash_value[:prefix], 16) % len(aliases)]
+
+
+#Alias to read from for a primary: one of its replicas unless pinned to the primary
+def read_alias(primary):
+    if _use_primary.get():
+        return primary
+    replicas = getattr(settings, 'DATABASE_REPLICAS', {}).get(primary)
+    if not replicas:
+        return primary
+    return random.choice(replicas)
+
+
+#Evaluates queryset (optionally narrowed by build) on every shard and merges the rows
+def fan_out(queryset, build=None):
+    build = build or (lambda shard_qs: shard_qs)
+    aliases = shard_aliases()
+    if len(aliases) == 1:
+        return list(build(queryset.using(read_alias(aliases[0]))))
+
+    rows = []
+    for alias in aliases:
+        rows.extend(build(queryset.using(read_alias(alias))))
+    rows.sort(key=lambda s: (s.created_at, s.sha256_hash))
+    return rows
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends AnalyzedString reads to replicas and writes to the primary of the
+    shard owning the row. Every other app lives on 'default' only.
+    """
+
+    app_label = 'analyzer'
+
+    def _primary_for(self, model, hints):
+        instance = hints.get('instance')
+        if instance is not None and getattr(instance, 'sha256_hash', None):
+            return shard_for_hash(instance.sha256_hash)
+        return shard_aliases()[0]
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != self.app_label:
+            return 'default'
+        return read_alias(self._primary_for(model, hints))
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label != self.app_label:
+            return 'default'
+        return self._primary_for(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication, not migrate
+        for replicas in getattr(settings, 'DATABASE_REPLICAS', {}).values():
+            if db in replicas:
+                return False
+        if app_label == self.app_label:
+            return db in shard_aliases()
+        return db == 'default'
@@ -0,0 +1,335 @@
+import importlib.util
+import io
+import json
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime, timezone
+
+from .models import AnalyzedString
+from .routers import read_alias, shard_aliases, shard_for_hash
+
+# pyarrow is optional, the built-in binary format is used without it
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+DEFAULT_CHUNK_SIZE = 5000
+
+BINARY_MAGIC = b'ASNAP1\n'
+PARQUET_MAGIC = b'PAR1'
+ARROW_STREAM_MAGIC = b'\xff\xff\xff\xff'
+
+# Column order shared by every format
+COLUMNS = (
+    'value',
+    'sha256_hash',
+    'length',
+    'is_palindrome',
+    'unique_characters',
+    'word_count',
+    'character_frequency_map',
+    'created_at',
+)
+
+_CHUNK_HEADER = struct.Struct('<II')  # row count, compressed payload size
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def available_formats():
+    if not HAS_PYARROW:
+        return ['binary']
+    return ['arrow', 'parquet', 'binary']
+
+
+#Picks arrow when pyarrow is installed, otherwise the built-in binary format
+def resolve_format(fmt):
+    if fmt in (None, '', 'auto'):
+        return 'arrow' if HAS_PYARROW else 'binary'
+    if fmt not in available_formats():
+        raise SnapshotError(f"Unsupported snapshot format '{fmt}', available: {', '.join(available_formats())}")
+    return fmt
+
+
+#Microseconds since the epoch, so timestamps travel as plain int64
+def _to_micros(value):
+    delta = value - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _from_micros(value):
+    return datetime.fromtimestamp(value // 1_000_000, tz=timezone.utc).replace(microsecond=value % 1_000_000)
+
+
+#Yields lists of rows (tuples in COLUMNS order) from every shard
+def iter_chunks(chunk_size=DEFAULT_CHUNK_SIZE):
+    for alias in shard_aliases():
+        rows = (
+            AnalyzedString.objects.using(read_alias(alias))
+            .order_by('pk')
+            .values_list(*COLUMNS)
+            .iterator(chunk_size=chunk_size)
+        )
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+#Turns a chunk of rows into one list per column with plain python values
+def _columns_of(chunk):
+    columns = [list(col) for col in zip(*chunk)]
+    columns[COLUMNS.index('character_frequency_map')] = [
+        json.dumps(m, separators=(',', ':'), ensure_ascii=False)
+        for m in columns[COLUMNS.index('character_frequency_map')]
+    ]
+    columns[COLUMNS.index('created_at')] = [_to_micros(d) for d in columns[COLUMNS.index('created_at')]]
+    return columns
+
+
+# Built-in binary format: magic, then zlib-compressed column chunks, then a
+# zero row count. Strings are a length array plus one utf-8 blob.
+
+def _int_array(values):
+    data = array('q', values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data
+
+
+def _pack_ints(values):
+    data = _int_array(values).tobytes()
+    return struct.pack('<I', len(data)) + data
+
+
+def _pack_strings(values):
+    encoded = [v.encode('utf-8') for v in values]
+    return _pack_ints([len(v) for v in encoded]) + _pack_blob(b''.join(encoded))
+
+
+def _pack_blob(data):
+    return struct.pack('<I', len(data)) + data
+
+
+def _encode_binary_chunk(chunk):
+    columns = dict(zip(COLUMNS, _columns_of(chunk)))
+    payload = b''.join([
+        _pack_strings(columns['value']),
+        _pack_blob(b''.join(bytes.fromhex(h) for h in columns['sha256_hash'])),
+        _pack_ints(columns['length']),
+        _pack_blob(bytes(columns['is_palindrome'])),
+        _pack_ints(columns['unique_characters']),
+        _pack_ints(columns['word_count']),
+        _pack_strings(columns['character_frequency_map']),
+        _pack_ints(columns['created_at']),
+    ])
+    compressed = zlib.compress(payload, 1)
+    return _CHUNK_HEADER.pack(len(chunk), len(compressed)) + compressed
+
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def blob(self):
+        size, = struct.unpack_from('<I', self.data, self.pos)
+        start = self.pos + 4
+        self.pos = start + size
+        return self.data[start:self.pos]
+
+    def ints(self):
+        data = array('q')
+        data.frombytes(self.blob())
+        if sys.byteorder == 'big':
+            data.byteswap()
+        return data.tolist()
+
+    def strings(self):
+        lengths = self.ints()
+        blob = self.blob()
+        values, pos = [], 0
+        for n in lengths:
+            values.append(blob[pos:pos + n].decode('utf-8'))
+            pos += n
+        return values
+
+
+def _read_exact(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise SnapshotError('Truncated snapshot')
+    return data
+
+
+def _iter_binary(stream):
+    while True:
+        count, size = _CHUNK_HEADER.unpack(_read_exact(stream, _CHUNK_HEADER.size))
+        if count == 0:
+            return
+        reader = _Reader(zlib.decompress(_read_exact(stream, size)))
+        values = reader.strings()
+        hashes = reader.blob()
+        columns = {
+            'value': values,
+            'sha256_hash': [hashes[i:i + 32].hex() for i in range(0, len(hashes), 32)],
+            'length': reader.ints(),
+            'is_palindrome': [bool(b) for b in reader.blob()],
+            'unique_characters': reader.ints(),
+            'word_count': reader.ints(),
+            'character_frequency_map': reader.strings(),
+            'created_at': reader.ints(),
+        }
+        if any(len(column) != count for column in columns.values()):
+            raise SnapshotError('Corrupt snapshot chunk')
+        yield columns
+
+
+# Arrow / Parquet, only when pyarrow is installed
+
+#pyarrow is slow to import, so it is only loaded once a snapshot needs it
+def _pyarrow():
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+    return pyarrow
+
+
+def _arrow_schema():
+    pyarrow = _pyarrow()
+    return pyarrow.schema([
+        ('value', pyarrow.string()),
+        ('sha256_hash', pyarrow.string()),
+        ('length', pyarrow.int64()),
+        ('is_palindrome', pyarrow.bool_()),
+        ('unique_characters', pyarrow.int64()),
+        ('word_count', pyarrow.int64()),
+        ('character_frequency_map', pyarrow.string()),
+        ('created_at', pyarrow.int64()),
+    ])
+
+
+def _arrow_batch(chunk, schema):
+    pyarrow = _pyarrow()
+    return pyarrow.RecordBatch.from_arrays(
+        [pyarrow.array(col, type=field.type) for col, field in zip(_columns_of(chunk), schema)],
+        schema=schema,
+    )
+
+
+#Yields the snapshot as byte strings, one per chunk, for streaming responses
+def iter_export(fmt='auto', chunk_size=DEFAULT_CHUNK_SIZE, stats=None):
+    fmt = resolve_format(fmt)
+    if fmt == 'parquet':
+        raise SnapshotError('Parquet needs a seekable file, use arrow for streaming')
+    stats = stats if stats is not None else {}
+    stats['rows'] = 0
+
+    if fmt == 'binary':
+        yield BINARY_MAGIC
+        for chunk in iter_chunks(chunk_size):
+            stats['rows'] += len(chunk)
+            yield _encode_binary_chunk(chunk)
+        yield _CHUNK_HEADER.pack(0, 0)
+        return
+
+    schema = _arrow_schema()
+    sink = io.BytesIO()
+    with _pyarrow().ipc.new_stream(sink, schema) as writer:
+        for chunk in iter_chunks(chunk_size):
+            stats['rows'] += len(chunk)
+            writer.write_batch(_arrow_batch(chunk, schema))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+#Writes the snapshot to path and returns the number of rows written
+def export_to_file(path, fmt='auto', chunk_size=DEFAULT_CHUNK_SIZE):
+    fmt = resolve_format(fmt)
+    if fmt == 'parquet':
+        rows = 0
+        schema = _arrow_schema()
+        with _pyarrow().parquet.ParquetWriter(path, schema) as writer:
+            for chunk in iter_chunks(chunk_size):
+                writer.write_batch(_arrow_batch(chunk, schema))
+                rows += len(chunk)
+        return rows
+
+    stats = {}
+    with open(path, 'wb') as f:
+        for data in iter_export(fmt, chunk_size, stats):
+            f.write(data)
+    return stats['rows']
+
+
+#Yields one dict of column lists per chunk, whatever format the file is in
+def iter_columns(stream, chunk_size=DEFAULT_CHUNK_SIZE):
+    head = stream.read(len(BINARY_MAGIC))
+    if head == BINARY_MAGIC:
+        columns = _iter_binary(stream)
+    elif head[:4] in (PARQUET_MAGIC, ARROW_STREAM_MAGIC):
+        if not HAS_PYARROW:
+            raise SnapshotError('pyarrow is required to read Arrow/Parquet snapshots')
+        columns = _iter_arrow(stream, head[:4] == PARQUET_MAGIC, chunk_size)
+    else:
+        raise SnapshotError('Unknown snapshot format')
+
+    # zlib, struct, utf-8 and Arrow (ArrowInvalid is a ValueError) all fail differently on bad input
+    try:
+        yield from columns
+    except (zlib.error, struct.error, ValueError, OSError) as e:
+        raise SnapshotError(f'Corrupt snapshot: {e}') from e
+
+
+def _iter_arrow(stream, parquet, chunk_size):
+    pyarrow = _pyarrow()
+    stream.seek(0)
+    if parquet:
+        batches = pyarrow.parquet.ParquetFile(stream).iter_batches(batch_size=chunk_size)
+    else:
+        batches = pyarrow.ipc.open_stream(stream)
+    for batch in batches:
+        yield batch.to_pydict()
+
+
+def _model_from_row(row):
+    return AnalyzedString(**{
+        **row,
+        'character_frequency_map': json.loads(row['character_frequency_map']),
+        'created_at': _from_micros(row['created_at']),
+    })
+
+
+#Bulk inserts a snapshot into the shard owning each row and returns (inserted, skipped)
+def import_snapshot(stream, chunk_size=DEFAULT_CHUNK_SIZE):
+    inserted = skipped = 0
+    for columns in iter_columns(stream, chunk_size):
+        by_shard = {}
+        for values in zip(*(columns[name] for name in COLUMNS)):
+            row = dict(zip(COLUMNS, values))
+            by_shard.setdefault(shard_for_hash(row['sha256_hash']), []).append(row)
+
+        for alias, rows in by_shard.items():
+            existing = set(
+                AnalyzedString.objects.using(alias)
+                .filter(sha256_hash__in=[row['sha256_hash'] for row in rows])
+                .values_list('sha256_hash', flat=True)
+            )
+            try:
+                objs = [_model_from_row(row) for row in rows if row['sha256_hash'] not in existing]
+            except ValueError as e:
+                raise SnapshotError(f'Corrupt snapshot: {e}') from e
+            # ignore_conflicts still covers rows written concurrently since the lookup
+            AnalyzedString.objects.using(alias).bulk_create(objs, batch_size=chunk_size, ignore_conflicts=True)
+            inserted += len(objs)
+            skipped += len(rows) - len(objs)
+    return inserted, skipped
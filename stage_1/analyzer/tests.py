@@ -1,3 +1,298 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+from datetime import datetime, timezone
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from . import routers, snapshot
+from .middleware import AdmissionControlMiddleware, ReadYourWritesMiddleware, _CacheBuckets
+from .models import AnalyzedString
+from .utils import character_frequency_map, sha256_hash
+
+SHARDED = 'shard_2' in settings.DATABASES
+RUN_SHARDED = "run with --settings=string_analyzer.settings_test"
+NO_RATE_LIMIT = {'RATE': 10**6, 'BURST': 10**6}
+LOCMEM = 'django.core.cache.backends.locmem.LocMemCache'
+TEST_DATABASES = {'default', 'shard_1', 'shard_2'} if SHARDED else {'default'}
+
+
+#First value of the form '<prefix><n>' whose hash lands on the given shard
+def value_on_shard(alias, prefix='s'):
+    n = 0
+    while routers.shard_for_hash(sha256_hash(f'{prefix}{n}')) != alias:
+        n += 1
+    return f'{prefix}{n}'
+
+
+class ShardForHashTests(SimpleTestCase):
+    @override_settings(ANALYZER_SHARDS=['a', 'b', 'c'], ANALYZER_SHARD_PREFIX_LENGTH=8)
+    def test_placement_uses_hash_prefix_modulo_shard_count(self):
+        self.assertEqual(routers.shard_for_hash('00000000' + 'f' * 56), 'a')
+        self.assertEqual(routers.shard_for_hash('00000001' + 'f' * 56), 'b')
+        self.assertEqual(routers.shard_for_hash('00000005' + '0' * 56), 'c')
+
+    @override_settings(ANALYZER_SHARDS=['a', 'b', 'c'], ANALYZER_SHARD_PREFIX_LENGTH=8)
+    def test_only_the_prefix_decides_the_shard(self):
+        self.assertEqual(
+            routers.shard_for_hash('0000000a' + '0' * 56),
+            routers.shard_for_hash('0000000a' + 'f' * 56),
+        )
+
+    @override_settings(ANALYZER_SHARDS=['default'])
+    def test_single_shard_is_default(self):
+        self.assertEqual(routers.shard_for_hash(sha256_hash('anything')), 'default')
+
+
+@skipUnless(SHARDED, RUN_SHARDED)
+@override_settings(ADMISSION_CONTROL=NO_RATE_LIMIT)
+class ShardedRoutingTests(TestCase):
+    databases = TEST_DATABASES
+
+    def setUp(self):
+        self.values = [value_on_shard(alias, prefix) for alias in routers.shard_aliases() for prefix in ('x', 'aba')]
+        for value in self.values:
+            response = self.client.post('/strings', {'value': value}, content_type='application/json')
+            self.assertEqual(response.status_code, 201)
+
+    def read_aliases_during(self, request):
+        chosen = []
+
+        def record(primary):
+            alias = routers.read_alias(primary)
+            chosen.append(alias)
+            return alias
+
+        with mock.patch('analyzer.views.read_alias', side_effect=record):
+            response = request()
+        return response, chosen
+
+    def test_rows_are_stored_on_their_owning_shard(self):
+        for value in self.values:
+            owner = routers.shard_for_hash(sha256_hash(value))
+            for alias in routers.shard_aliases():
+                stored = AnalyzedString.objects.using(alias).filter(value=value).exists()
+                self.assertEqual(stored, alias == owner, (value, alias))
+
+    def test_list_merges_every_shard(self):
+        data = self.client.get('/strings').json()
+        self.assertEqual(data['count'], len(self.values))
+        self.assertCountEqual([s['value'] for s in data['data']], self.values)
+        created = [s['created_at'] for s in data['data']]
+        self.assertEqual(created, sorted(created))
+
+    def test_list_filters_apply_on_every_shard(self):
+        data = self.client.get('/strings', {'min_length': 4, 'contains_character': 'b'}).json()
+        expected = [v for v in self.values if len(v) >= 4 and 'b' in v]
+        self.assertCountEqual([s['value'] for s in data['data']], expected)
+
+    def test_natural_language_filter_fans_out(self):
+        results = self.client.get('/strings/filter-by-natural-language', {'q': 'even'}).json()['results']
+        expected = [v for v in self.values if len(v) % 2 == 0]
+        self.assertCountEqual([r['value'] for r in results], expected)
+
+    def test_detail_reads_from_the_owning_shard(self):
+        for alias in ('shard_1', 'shard_2'):
+            value = value_on_shard(alias, 'x')
+            response, chosen = self.read_aliases_during(lambda: self.client.get(f'/strings/{value}'))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['value'], value)
+            self.assertEqual(chosen, [alias])
+
+
+
+@override_settings(DATABASE_REPLICAS={'default': ['default_replica_0']})
+class ReadYourWritesTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.chosen = []
+
+        def view(request):
+            self.chosen.append(routers.read_alias('default'))
+            return HttpResponse(status=201 if request.method == 'POST' else 200)
+
+        self.middleware = ReadYourWritesMiddleware(view)
+
+    def test_reads_switch_from_replica_to_primary_after_a_write(self):
+        self.middleware(self.factory.get('/strings'))
+        response = self.middleware(self.factory.post('/strings'))
+        pin = response.cookies['analyzer_pin_primary']
+        self.assertEqual(pin['max-age'], settings.REPLICA_PIN_SECONDS)
+
+        request = self.factory.get('/strings')
+        request.COOKIES['analyzer_pin_primary'] = pin.value
+        self.middleware(request)
+
+        self.assertEqual(self.chosen, ['default_replica_0', 'default', 'default'])
+
+    def test_failed_writes_do_not_pin(self):
+        response = ReadYourWritesMiddleware(lambda request: HttpResponse(status=409))(self.factory.post('/strings'))
+        self.assertNotIn('analyzer_pin_primary', response.cookies)
+
+    def test_pin_is_reset_after_the_request(self):
+        self.middleware(self.factory.post('/strings'))
+        self.assertEqual(routers.read_alias('default'), 'default_replica_0')
+
+    def test_router_sends_reads_to_replicas_and_writes_to_primary(self):
+        router = routers.PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(AnalyzedString), 'default_replica_0')
+        self.assertEqual(router.db_for_write(AnalyzedString), 'default')
+        self.assertFalse(router.allow_migrate('default_replica_0', 'analyzer'))
+
+
+@override_settings(ADMISSION_CONTROL=NO_RATE_LIMIT)
+class SnapshotTests(TestCase):
+    databases = TEST_DATABASES
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        for n, value in enumerate(['madam', 'hello world', 'naïve café', 'x' * 3000, 'export']):
+            hash_value = sha256_hash(value)
+            AnalyzedString.objects.using(routers.shard_for_hash(hash_value)).create(
+                value=value,
+                sha256_hash=hash_value,
+                length=len(value),
+                is_palindrome=value == value[::-1],
+                unique_characters=len(set(value)),
+                word_count=len(value.split()),
+                character_frequency_map=character_frequency_map(value),
+                created_at=datetime(2025, 10, 22, 9, 59, n, 123456, tzinfo=timezone.utc),
+            )
+
+    def table(self):
+        rows = []
+        for alias in routers.shard_aliases():
+            rows.extend(AnalyzedString.objects.using(alias).values_list(*snapshot.COLUMNS))
+        return sorted(rows)
+
+    def clear(self):
+        for alias in routers.shard_aliases():
+            AnalyzedString.objects.using(alias).all().delete()
+
+    def path(self, name):
+        return os.path.join(self.tmp, name)
+
+    def test_round_trip_every_format(self):
+        original = self.table()
+        for fmt in snapshot.available_formats():
+            with self.subTest(fmt=fmt):
+                path = self.path(f'strings.{fmt}')
+                self.assertEqual(snapshot.export_to_file(path, fmt, chunk_size=2), len(original))
+                self.clear()
+                with open(path, 'rb') as f:
+                    self.assertEqual(snapshot.import_snapshot(f, chunk_size=2), (len(original), 0))
+                self.assertEqual(self.table(), original)
+
+    def test_reimport_skips_existing_rows(self):
+        path = self.path('strings.bin')
+        snapshot.export_to_file(path, 'binary')
+        with open(path, 'rb') as f:
+            self.assertEqual(snapshot.import_snapshot(f), (0, 5))
+
+    def test_empty_table(self):
+        self.clear()
+        for fmt in snapshot.available_formats():
+            with self.subTest(fmt=fmt):
+                path = self.path(f'empty.{fmt}')
+                self.assertEqual(snapshot.export_to_file(path, fmt), 0)
+                with open(path, 'rb') as f:
+                    self.assertEqual(snapshot.import_snapshot(f), (0, 0))
+
+    def test_truncated_file(self):
+        for fmt in ('binary', 'arrow') if snapshot.HAS_PYARROW else ('binary',):
+            with self.subTest(fmt=fmt):
+                data = b''.join(snapshot.iter_export(fmt))
+                with self.assertRaises(snapshot.SnapshotError):
+                    snapshot.import_snapshot(io.BytesIO(data[:len(data) // 2]))
+
+    def test_corrupt_chunk(self):
+        data = bytearray(b''.join(snapshot.iter_export('binary')))
+        data[len(snapshot.BINARY_MAGIC) + 20] ^= 0xFF
+        with self.assertRaises(snapshot.SnapshotError):
+            snapshot.import_snapshot(io.BytesIO(bytes(data)))
+
+    def test_unknown_format(self):
+        with self.assertRaises(snapshot.SnapshotError):
+            snapshot.import_snapshot(io.BytesIO(b'not a snapshot'))
+
+    def test_import_command_reports_corrupt_file(self):
+        path = self.path('corrupt.bin')
+        with open(path, 'wb') as f:
+            f.write(snapshot.BINARY_MAGIC + b'\x05\x00\x00\x00\x04\x00\x00\x00junk')
+        with self.assertRaises(CommandError):
+            call_command('import_strings', path, stdout=io.StringIO())
+
+    def test_export_endpoint_streams_snapshot(self):
+        response = self.client.get('/strings-export', {'type': 'binary'})
+        self.assertEqual(response.status_code, 200)
+        columns = list(snapshot.iter_columns(io.BytesIO(b''.join(response.streaming_content))))
+        self.assertCountEqual(
+            [value for chunk in columns for value in chunk['value']],
+            [row[0] for row in self.table()],
+        )
+
+    def test_export_endpoint_does_not_hide_a_string_named_export(self):
+        response = self.client.get('/strings/export')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['value'], 'export')
+
+
+class AdmissionControlTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def middleware(self, view, **config):
+        with override_settings(ADMISSION_CONTROL={'RATE': 1, 'BURST': 10, **config}):
+            return AdmissionControlMiddleware(view)
+
+    def test_bucket_is_charged_by_cost_and_rejects_with_retry_after(self):
+        middleware = self.middleware(lambda request: HttpResponse(), BYTES_PER_TOKEN=100)
+        body = 'x' * 450  # 1 + 4 tokens
+        self.assertEqual(middleware(self.factory.post('/strings', body, content_type='text/plain')).status_code, 200)
+        self.assertEqual(middleware(self.factory.post('/strings', body, content_type='text/plain')).status_code, 200)
+        response = middleware(self.factory.post('/strings', body, content_type='text/plain'))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '5')
+
+    def test_view_costs_apply_to_the_natural_language_filter(self):
+        middleware = self.middleware(lambda request: HttpResponse(), VIEW_COSTS={'filter_by_natural_language': 4})
+        request = self.factory.get('/strings/filter-by-natural-language', {'q': 'even'})
+        self.assertEqual(middleware.request_cost(request), 5)
+        self.assertEqual(middleware.request_cost(self.factory.get('/strings/madam')), 1)
+
+    def test_streaming_response_holds_the_slot_until_closed(self):
+        middleware = self.middleware(
+            lambda request: StreamingHttpResponse(iter([b'a', b'b'])),
+            MAX_CONCURRENT=1, MAX_QUEUE=0, QUEUE_TIMEOUT=0,
+        )
+        streaming = middleware(self.factory.get('/strings-export', REMOTE_ADDR='1.1.1.1'))
+        self.assertEqual(middleware(self.factory.get('/strings-export', REMOTE_ADDR='2.2.2.2')).status_code, 503)
+        b''.join(streaming.streaming_content)
+        streaming.close()
+        self.assertEqual(middleware(self.factory.get('/strings-export', REMOTE_ADDR='2.2.2.2')).status_code, 200)
+
+    def test_shed_requests_are_not_charged(self):
+        middleware = self.middleware(lambda request: HttpResponse(), MAX_CONCURRENT=1, MAX_QUEUE=0, QUEUE_TIMEOUT=0)
+        middleware.slots.acquire()
+        for _ in range(20):
+            self.assertEqual(middleware(self.factory.get('/strings')).status_code, 503)
+        middleware.slots.release()
+        self.assertEqual(middleware(self.factory.get('/strings')).status_code, 200)
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': LOCMEM},
+        'admission': {'BACKEND': LOCMEM, 'LOCATION': 'admission-tests'},
+    })
+    def test_cache_buckets_are_shared_between_workers(self):
+        workers = [self.middleware(lambda request: HttpResponse(), CACHE='admission') for _ in range(2)]
+        self.assertIsInstance(workers[0].buckets, _CacheBuckets)
+        for n in range(10):
+            self.assertEqual(workers[n % 2](self.factory.get('/strings')).status_code, 200)
+        self.assertEqual(workers[0](self.factory.get('/strings')).status_code, 429)
+        self.assertEqual(workers[1](self.factory.get('/strings')).status_code, 429)
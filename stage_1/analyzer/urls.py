@@ -3,6 +3,7 @@ from . import views
 
 urlpatterns = [
     path('strings', views.strings_collection, name='strings_collection'),
-    path('strings/<str:value>', views.string_detail, name='string_detail'),
+    path('strings-export', views.export_strings, name='export_strings'),
     path('strings/filter-by-natural-language', views.filter_by_natural_language, name='filter_by_natural_language'),
+    path('strings/<str:value>', views.string_detail, name='string_detail'),
 ]
\ No newline at end of file
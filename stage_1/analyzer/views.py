@@ -1,8 +1,14 @@
+import logging
+import time
+
 from django.db import IntegrityError
+from django.http import StreamingHttpResponse
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 from .models import AnalyzedString
+from .routers import fan_out, read_alias, shard_for_hash
+from .snapshot import SnapshotError, iter_export, resolve_format
 from .utils import (
     get_length,
     is_palindrome,
@@ -12,6 +18,13 @@ from .utils import (
     character_frequency_map
 )
 
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_CONTENT_TYPES = {
+    'arrow': ('application/vnd.apache.arrow.stream', 'strings.arrow'),
+    'binary': ('application/octet-stream', 'strings.snap'),
+}
+
 
 # POST /strings and GET /strings?filters...
 @api_view(['GET', 'POST'])
@@ -30,7 +43,7 @@ def strings_collection(request):
         hash_value = sha256_hash(text)
 
         try:
-            analyzed = AnalyzedString.objects.create(
+            analyzed = AnalyzedString.objects.using(shard_for_hash(hash_value)).create(
                 value=text,
                 sha256_hash=hash_value,
                 length=get_length(text),
@@ -93,16 +106,41 @@ def strings_collection(request):
             "character_frequency_map": s.character_frequency_map,
         },
         "created_at": s.created_at.isoformat() + "Z"
-    } for s in qs]
+    } for s in fan_out(qs)]
 
     return Response({"data": data, "count": len(data)}, status=status.HTTP_200_OK)
 
 
+# GET /strings-export?type=arrow|binary
+@api_view(['GET'])
+def export_strings(request):
+    try:
+        fmt = resolve_format(request.GET.get('type'))
+    except SnapshotError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if fmt not in SNAPSHOT_CONTENT_TYPES:
+        return Response({"error": f"'{fmt}' cannot be streamed, use arrow or binary"}, status=status.HTTP_400_BAD_REQUEST)
+
+    def stream():
+        stats = {}
+        started = time.perf_counter()
+        yield from iter_export(fmt, stats=stats)
+        elapsed = time.perf_counter() - started
+        logger.info("Exported %d rows as %s in %.2fs (%.0f rows/s)",
+                    stats['rows'], fmt, elapsed, stats['rows'] / elapsed if elapsed else 0)
+
+    content_type, filename = SNAPSHOT_CONTENT_TYPES[fmt]
+    response = StreamingHttpResponse(stream(), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 # GET /strings/{value} and DELETE /strings/{value}
 @api_view(['GET', 'DELETE'])
 def string_detail(request, value):
     try:
-        analyzed = AnalyzedString.objects.get(value=value)
+        shard = read_alias(shard_for_hash(sha256_hash(value)))
+        analyzed = AnalyzedString.objects.using(shard).get(value=value)
     except AnalyzedString.DoesNotExist:
         return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -131,18 +169,21 @@ def string_detail(request, value):
 @api_view(['GET'])
 def filter_by_natural_language(request):
     query = request.GET.get('q', '').lower()
-    strings = AnalyzedString.objects.all()
-
-    if "palindrome" in query:
-        strings = strings.filter(is_palindrome=True)
-    elif "even" in query:
-        strings = [s for s in strings if s.length % 2 == 0]
-    elif "odd" in query:
-        strings = [s for s in strings if s.length % 2 != 0]
-    elif "uppercase" in query:
-        strings = strings.filter(value__regex=r'^[A-Z]+$')
-    elif "lowercase" in query:
-        strings = strings.filter(value__regex=r'^[a-z]+$')
+
+    def build(strings):
+        if "palindrome" in query:
+            strings = strings.filter(is_palindrome=True)
+        elif "even" in query:
+            strings = [s for s in strings if s.length % 2 == 0]
+        elif "odd" in query:
+            strings = [s for s in strings if s.length % 2 != 0]
+        elif "uppercase" in query:
+            strings = strings.filter(value__regex=r'^[A-Z]+$')
+        elif "lowercase" in query:
+            strings = strings.filter(value__regex=r'^[a-z]+$')
+        return strings
+
+    strings = fan_out(AnalyzedString.objects.all(), build)
 
     data = [{
         "value": s.value,
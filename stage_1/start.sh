@@ -2,6 +2,6 @@
 set -o errexit
 
 pip install -r requirements.txt
-python manage.py migrate
+python manage.py migrate_shards
 python manage.py collectstatic --noinput
-gunicorn string_analyzer.wsgi:application --bind 0.0.0.0:$PORT
+gunicorn string_analyzer.wsgi:application --bind 0.0.0.0:$PORT --threads ${WEB_THREADS:-24}
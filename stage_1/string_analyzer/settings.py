@@ -29,6 +29,10 @@ DEBUG = False
 
 ALLOWED_HOSTS = ["*"]
 
+# API-only mode drops the admin, sessions, messages, templates and the DRF
+# browsable API, none of which the JSON endpoints use. Enable with API_ONLY=1.
+API_ONLY = os.environ.get('API_ONLY', '') == '1'
+
 
 # Application definition
 
@@ -45,12 +49,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'analyzer.middleware.AdmissionControlMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'analyzer.middleware.ReadYourWritesMiddleware',
 ]
 
 ROOT_URLCONF = 'string_analyzer.urls'
@@ -70,6 +76,29 @@ TEMPLATES = [
     },
 ]
 
+if API_ONLY:
+    INSTALLED_APPS = [
+        'django.contrib.staticfiles',
+        'analyzer',
+    ]
+
+    MIDDLEWARE = [
+        'django.middleware.security.SecurityMiddleware',
+        'analyzer.middleware.AdmissionControlMiddleware',
+        'django.middleware.common.CommonMiddleware',
+        'analyzer.middleware.ReadYourWritesMiddleware',
+    ]
+
+    TEMPLATES = []
+
+    REST_FRAMEWORK = {
+        'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+        'DEFAULT_PARSER_CLASSES': ['rest_framework.parsers.JSONParser'],
+        'DEFAULT_AUTHENTICATION_CLASSES': [],
+        'DEFAULT_PERMISSION_CLASSES': [],
+        'UNAUTHENTICATED_USER': None,
+    }
+
 WSGI_APPLICATION = 'string_analyzer.wsgi.application'
 
 
@@ -83,6 +112,79 @@ DATABASES = {
     )
 }
 
+
+def _database_urls(env_name):
+    return [url.strip() for url in os.environ.get(env_name, '').split(',') if url.strip()]
+
+
+def _add_replicas(primary, env_name):
+    aliases = []
+    for i, url in enumerate(_database_urls(env_name)):
+        alias = f'{primary}_replica_{i}'
+        DATABASES[alias] = dj_database_url.parse(url, conn_max_age=600)
+        DATABASES[alias]['TEST'] = {'MIRROR': primary}
+        aliases.append(alias)
+    if aliases:
+        DATABASE_REPLICAS[primary] = aliases
+
+
+# Extra shards for AnalyzedString, partitioned by sha256_hash prefix.
+# 'default' is shard 0, e.g. ANALYZER_SHARD_URLS=sqlite:///shard_1.sqlite3,sqlite:///shard_2.sqlite3
+ANALYZER_SHARDS = ['default']
+ANALYZER_SHARD_PREFIX_LENGTH = 8
+
+for i, url in enumerate(_database_urls('ANALYZER_SHARD_URLS'), start=1):
+    DATABASES[f'shard_{i}'] = dj_database_url.parse(url, conn_max_age=600)
+    ANALYZER_SHARDS.append(f'shard_{i}')
+
+# Read replicas per primary: DATABASE_REPLICA_URLS for 'default',
+# SHARD_<n>_REPLICA_URLS for 'shard_<n>'
+DATABASE_REPLICAS = {}
+_add_replicas('default', 'DATABASE_REPLICA_URLS')
+for alias in ANALYZER_SHARDS[1:]:
+    _add_replicas(alias, f'{alias.upper()}_REPLICA_URLS')
+
+DATABASE_ROUTERS = ['analyzer.routers.PrimaryReplicaRouter']
+
+# How long a client reads from the primaries after a write
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+
+# Shared cache for the admission control buckets, e.g.
+# ADMISSION_CACHE_URL=redis://localhost:6379/0 (needs the redis package).
+# Without it every worker keeps its own buckets.
+ADMISSION_CACHE_URL = os.environ.get('ADMISSION_CACHE_URL', '')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+if ADMISSION_CACHE_URL:
+    CACHES['admission'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': ADMISSION_CACHE_URL,
+    }
+
+# Admission control: per-client token buckets and a concurrency limit per
+# worker process. The limit only applies with a threaded worker, so start.sh
+# runs gunicorn with WEB_THREADS (default 24) threads, above MAX_CONCURRENT
+# plus MAX_QUEUE so excess requests are shed with a 503 instead of waiting.
+ADMISSION_CONTROL = {
+    'RATE': int(os.environ.get('ADMISSION_RATE', 20)),
+    'BURST': int(os.environ.get('ADMISSION_BURST', 40)),
+    'BYTES_PER_TOKEN': 4096,
+    'VIEW_COSTS': {
+        'strings_collection': 5,
+        'filter_by_natural_language': 5,
+        'export_strings': 20,
+    },
+    'MAX_CONCURRENT': int(os.environ.get('ADMISSION_MAX_CONCURRENT', 8)),
+    'MAX_QUEUE': int(os.environ.get('ADMISSION_MAX_QUEUE', 8)),
+    'QUEUE_TIMEOUT': 0.5,
+    'TRUST_X_FORWARDED_FOR': os.environ.get('ADMISSION_TRUST_X_FORWARDED_FOR', '') == '1',
+    'CACHE': 'admission' if ADMISSION_CACHE_URL else None,
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -124,3 +226,24 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Logging
+# https://docs.djangoproject.com/en/5.2/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # snapshot export throughput is reported at INFO
+        'analyzer': {
+            'handlers': ['console'],
+            'level': os.environ.get('ANALYZER_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
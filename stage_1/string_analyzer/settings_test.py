@@ -0,0 +1,17 @@
+"""
+Test settings for string_analyzer: two extra SQLite shards, so sharding and
+fan-out can be tested locally.
+
+    python manage.py test --settings=string_analyzer.settings_test
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, DATABASES
+
+# a new dict, so the shards never leak into string_analyzer.settings.DATABASES
+DATABASES = {
+    **DATABASES,
+    'shard_1': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'shard_1.sqlite3'},
+    'shard_2': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'shard_2.sqlite3'},
+}
+
+ANALYZER_SHARDS = ['default', 'shard_1', 'shard_2']